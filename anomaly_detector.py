@@ -1,45 +1,448 @@
 from sklearn.ensemble import IsolationForest
-from collections import deque
+from collections import OrderedDict
+from statistics import NormalDist
+import os
+import sklearn
+import numpy as np
+
+try:
+    import treelite
+    if int(treelite.__version__.split(".")[0]) < 4:  # Older releases have a different scoring API
+        treelite = None
+except ImportError:  # Treelite is optional; without it scoring goes through scikit-learn
+    treelite = None
+
+# Treelite scoring saves scikit-learn's ~1.5 ms per-call overhead but is slower per row on large
+# inputs, and importing a forest costs a few milliseconds. It is therefore used only for calls of
+# at most _TREELITE_MAX_ROWS rows, and the forest is imported only when at least
+# _TREELITE_MIN_CALLS such calls are expected before the next refit.
+_TREELITE_MAX_ROWS = 1024
+_TREELITE_MIN_CALLS = 4
+
+try:
+    from numba import njit
+except ImportError:  # Numba is optional; without it the kernels below run as plain Python
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+
+def _make_isolation_forest(**params):
+    """
+    Creates the Isolation Forest model, using the GPU implementation from cuML when the
+    ANOMALY_DETECTOR_BACKEND environment variable is set to "cuml" and cuML is installed.
+    Falls back to scikit-learn otherwise.
+
+    Args:
+    - params: Keyword arguments passed to the IsolationForest constructor.
+
+    Returns:
+    - An IsolationForest instance with the scikit-learn fit/predict API.
+    """
+    if os.environ.get("ANOMALY_DETECTOR_BACKEND", "").lower() == "cuml":
+        try:
+            from cuml.ensemble import IsolationForest as CumlIsolationForest
+            return CumlIsolationForest(**params)
+        except Exception as e:
+            print(f"cuML backend unavailable, using scikit-learn: {e}")
+    return IsolationForest(**params)
+
+
+def _to_numpy(array):
+    """
+    Converts a model output to a NumPy array, copying it back from the GPU if needed.
+
+    Args:
+    - array: A NumPy array or a GPU (CuPy) array.
+
+    Returns:
+    - A NumPy ndarray.
+    """
+    if hasattr(array, "__cuda_array_interface__"):
+        return array.get()
+    return np.asarray(array)
+
+
+@njit(cache=True)
+def _zscore_step(buf, mean, m2, n, x, threshold):
+    """
+    Scores one value against the sliding window, then adds it to the window.
+    Compiled with Numba when it is installed.
+
+    Args:
+    - buf: Ring buffer of the sliding window, updated in place.
+    - mean, m2, n: Window mean, sum of squared deviations and total number of values written.
+    - x: The new value.
+    - threshold: The z-score above which a value is an anomaly.
+
+    Returns:
+    - Tuple (mean, m2, n, is_anomaly) with the updated state and the anomaly flag for x.
+    """
+    window_size = buf.shape[0]
+
+    # Score against the window before the new value joins it
+    is_anomaly = False
+    if n >= window_size:
+        std = np.sqrt(max(m2, 0.0) / window_size)
+        is_anomaly = std > 0.0 and abs(x - mean) > threshold * std
+
+    slot = n % window_size
+    if n < window_size:
+        # Growing window: standard Welford update
+        delta = x - mean
+        mean += delta / (n + 1)
+        m2 += delta * (x - mean)
+    else:
+        # Full window: replace the oldest value in one step
+        old_value = buf[slot]
+        old_mean = mean
+        mean += (x - old_value) / window_size
+        m2 += (x - old_value) * (x - mean + old_value - old_mean)
+    buf[slot] = x
+    return mean, m2, n + 1, is_anomaly
+
+
+@njit(cache=True)
+def _zscore_block(buf, mean, m2, n, values, threshold, flags):
+    """
+    Applies _zscore_step to each value in turn, writing the anomaly flags into flags.
+
+    Returns:
+    - Tuple (mean, m2, n) with the updated state.
+    """
+    for i in range(values.shape[0]):
+        mean, m2, n, is_anomaly = _zscore_step(buf, mean, m2, n, values[i], threshold)
+        flags[i] = is_anomaly
+    return mean, m2, n
+
 
 class AnomalyDetector:
-    def __init__(self, window_size=100):
+    def __init__(self, window_size=100, batch_size=16, stride=None, quantum=None, cache_size=4096):
         """
         Initializes the anomaly detector using the Isolation Forest algorithm with a sliding window.
-        
+
         Args:
         - window_size: Number of data points to consider at once for detection (default is 100).
+        - batch_size: Number of pending points scored together by a single predict call (default is 16).
+        - stride: Number of new points after which the model is refitted on the current window,
+          so it follows drift in the stream (default is window_size // 4).
+        - quantum: If set, values are rounded to a multiple of this before scoring, and predictions are
+          cached per rounded value so repeated readings skip predict (default is None, no cache).
+          The cache is emptied on every refit, so it only pays off when refits are rare compared with
+          the number of distinct rounded values (e.g. a large stride); with the default stride it just
+          adds overhead. Rounded values are scored instead of the exact readings, so flags near the
+          threshold can differ from uncached scoring.
+        - cache_size: Maximum number of cached predictions (default is 4096).
         """
-        # Initialize the Isolation Forest with a default contamination of 5% anomalies
-        self.model = IsolationForest(contamination=0.05)
+        # Initialize the Isolation Forest with a default contamination of 5% anomalies.
+        # A small forest with small subsamples is plenty for a univariate window of this size.
+        self.model = _make_isolation_forest(n_estimators=25, max_samples=min(64, window_size),
+                                            contamination=0.05, random_state=0)
         self.window_size = window_size
-        # Use deque to maintain a sliding window of recent data
-        self.data_window = deque(maxlen=window_size)
+        self.batch_size = batch_size
+        self.stride = stride if stride is not None else max(window_size // 4, 1)
+        self._n_at_fit = 0  # Value of _n when the model was last fitted
+        # Preallocated C-contiguous ring buffer holding the sliding window of recent data.
+        # It is passed straight to fit, which does not care about row order.
+        self._buf = np.zeros((window_size, 1), dtype=np.float32)
+        self._n = 0  # Total number of values written; the next slot is _n % window_size
+        # Points waiting to be scored together in one vectorized predict call
+        self._pending = np.empty((batch_size, 1), dtype=np.float32)
+        self._n_pending = 0
+        self.quantum = quantum
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # LRU cache of rounded value -> anomaly flag for the current model
+        self._compiled = None  # Treelite copy of the fitted forest, imported lazily by _compiled_model
+        self._compiled_offset = None  # Threshold for Treelite scores, computed from Treelite's own scores
+        self._threshold_window = None  # Copy of the window model.offset_ was last computed from
+        self._compile_tried = False  # Whether a Treelite import was already attempted for the current fit
+        self._treelite_failed = False  # Set once Treelite scoring fails, to stop using it
         self.is_model_trained = False  # Flag to track model training status
 
+    def _append(self, values):
+        """
+        Writes a block of values into the ring buffer, overwriting the oldest entries.
+
+        Args:
+        - values: Array of shape (n, 1) with the values to store.
+        """
+        n_new = len(values)
+        values = values[-self.window_size:]
+        slots = (self._n + n_new - len(values) + np.arange(len(values))) % self.window_size
+        self._buf[slots] = values
+        self._n += n_new
+
+    @property
+    def data_window(self):
+        """
+        Returns the current window in insertion order (oldest value first).
+        This is a copy built on demand; training uses the ring buffer directly.
+        """
+        if self._n < self.window_size:
+            return self._buf[:self._n].copy()
+        return np.roll(self._buf, -(self._n % self.window_size), axis=0)
+
+    def _score(self, values):
+        """
+        Adds a block of values to the window and scores them with a single predict call.
+
+        Args:
+        - values: Array of shape (n, 1) with the values to score.
+
+        Returns:
+        - Boolean ndarray: True for each value detected as an anomaly.
+        """
+        self._append(values)
+
+        # Ensure the window is full before training the model
+        if self._n < self.window_size:
+            return np.zeros(len(values), dtype=bool)  # Not enough data to detect anomalies yet
+
+        if not self.is_model_trained or self._n - self._n_at_fit >= self.stride:
+            # Train the model on the initial data window, then refit periodically on the latest one
+            self._fit()
+
+        if self.quantum is None:
+            return self._predict(values)
+        return self._cached_predict(values)
+
+    def _fit(self):
+        """
+        Fits the model on the current window and resets everything derived from the previous fit.
+        """
+        # Input is always a finite float32 ndarray with valid parameters, so skip sklearn's validation
+        with sklearn.config_context(assume_finite=True, skip_parameter_validation=True):
+            self.model.fit(self._buf)
+        self._n_at_fit = self._n
+        self._threshold_window = self._buf.copy()  # fit computes offset_ from the training window
+        self._cache.clear()
+        self._compiled = None
+        self._compiled_offset = None
+        self._compile_tried = False
+        self.is_model_trained = True
+
+    def _compiled_model(self, n_rows):
+        """
+        Returns the Treelite copy of the current forest, importing it on first use after a fit.
+        Treelite is used only for small calls, and the import is only done when enough calls of
+        this size are expected before the next refit for it to pay off.
+
+        Treelite scores differ from score_samples in the last bits, and offset_ often equals a
+        score exactly, so Treelite scores are compared against a threshold computed from Treelite's
+        own scores of the same window. The import is rejected if the two backends then disagree on
+        that window.
+
+        Args:
+        - n_rows: Number of rows about to be scored.
+
+        Returns:
+        - The Treelite model, or None to score with scikit-learn.
+        """
+        if n_rows > _TREELITE_MAX_ROWS:
+            return None
+        if (self._compiled is None and not self._compile_tried and not self._treelite_failed
+                and treelite is not None and isinstance(self.model, IsolationForest)
+                and self.stride // max(n_rows, 1) >= _TREELITE_MIN_CALLS):
+            self._compile_tried = True
+            try:
+                compiled = treelite.sklearn.import_model(self.model)
+                scores = self._treelite_scores(compiled, self._threshold_window)
+                offset = np.percentile(scores, 100.0 * self.model.contamination)
+                # Otherwise keep scoring this fit with scikit-learn
+                if np.array_equal(scores < offset, self._sklearn_predict(self._threshold_window)):
+                    self._compiled, self._compiled_offset = compiled, offset
+            except Exception as e:
+                print(f"Treelite import failed, using scikit-learn: {e}")
+        return self._compiled
+
+    def _disable_treelite(self, error):
+        """
+        Stops using Treelite for this detector after a scoring failure.
+
+        Args:
+        - error: The exception raised by Treelite.
+        """
+        print(f"Treelite scoring failed, using scikit-learn: {error}")
+        self._compiled = None
+        self._compiled_offset = None
+        self._treelite_failed = True
+
+    @staticmethod
+    def _treelite_scores(compiled, values):
+        """
+        Computes the score of each value with a Treelite model, on the same scale as score_samples.
+
+        Args:
+        - compiled: The Treelite model.
+        - values: Array of shape (n, 1) with the values to score.
+
+        Returns:
+        - Float ndarray of scores (lower is more anomalous).
+        """
+        # Treelite returns the anomaly score with the opposite sign to score_samples
+        return -treelite.gtil.predict(compiled, values, nthread=1).reshape(-1)
+
+    def _score_samples(self, values):
+        """
+        Computes the Isolation Forest score of each value (lower is more anomalous).
+
+        Args:
+        - values: Array of shape (n, 1) with the values to score.
+
+        Returns:
+        - Float ndarray of scores, as returned by IsolationForest.score_samples.
+        """
+        with sklearn.config_context(assume_finite=True, skip_parameter_validation=True):
+            return _to_numpy(self.model.score_samples(values))
+
+    def _sklearn_predict(self, values):
+        """
+        Predicts anomaly flags for a block of values with the model's own predict.
+
+        Args:
+        - values: Array of shape (n, 1) with the values to score.
+
+        Returns:
+        - Boolean ndarray: True for each value detected as an anomaly.
+        """
+        with sklearn.config_context(assume_finite=True, skip_parameter_validation=True):
+            return _to_numpy(self.model.predict(values)) == -1  # True where detected as anomaly
+
+    def _predict(self, values):
+        """
+        Predicts anomaly flags for a block of values with a single call into the model.
+
+        Args:
+        - values: Array of shape (n, 1) with the values to score.
+
+        Returns:
+        - Boolean ndarray: True for each value detected as an anomaly.
+        """
+        compiled = self._compiled_model(len(values))
+        if compiled is not None:
+            try:
+                return self._treelite_scores(compiled, values) < self._compiled_offset
+            except Exception as e:
+                self._disable_treelite(e)
+        return self._sklearn_predict(values)
+
+    def _cached_predict(self, values):
+        """
+        Predicts anomaly flags for rounded values, calling predict only for values not already cached.
+
+        Args:
+        - values: Array of shape (n, 1) with the values to score.
+
+        Returns:
+        - Boolean ndarray: True for each value detected as an anomaly.
+        """
+        keys = np.round(values[:, 0] / self.quantum).astype(np.int64).tolist()
+        missing = [key for key in dict.fromkeys(keys) if key not in self._cache]
+        if missing:
+            rounded = (np.array(missing, dtype=np.float32) * self.quantum).reshape(-1, 1)
+            self._cache.update(zip(missing, self._predict(rounded).tolist()))
+
+        flags = np.empty(len(keys), dtype=bool)
+        for i, key in enumerate(keys):
+            flags[i] = self._cache[key]
+            self._cache.move_to_end(key)  # Mark as recently used
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)  # Evict the least recently used prediction
+        return flags
+
     def detect(self, new_value):
         """
         Detects whether the latest data point is an anomaly.
-        
+
         Args:
         - new_value: The latest value from the data stream.
-        
+
         Returns:
         - Boolean: True if the value is an anomaly, False otherwise.
         """
-        self.data_window.append([new_value])  # Add the new value to the sliding window
-        
-        # Ensure the window is full before training the model
-        if len(self.data_window) >= self.window_size:
-            if not self.is_model_trained:
-                # Train the model on the initial data window
-                self.model.fit(self.data_window)
-                self.is_model_trained = True
-            
-            # Use the trained model to predict if the new value is an anomaly
-            prediction = self.model.predict([[new_value]])
-            return prediction[0] == -1  # Return True if detected as anomaly
-        
-        return False  # Not enough data to detect anomalies yet
+        return bool(self._score(np.array([[new_value]], dtype=np.float32))[0])
+
+    def detect_batch(self, values):
+        """
+        Detects anomalies in a block of values with a single predict call, for bulk paths such as
+        replaying history or backtesting. Values before the window first fills are used to train
+        the model and are not flagged; all remaining values are scored by the same model.
+        Points queued by submit are not included.
+
+        Args:
+        - values: Sequence or array of values, in stream order.
+
+        Returns:
+        - Boolean ndarray: True for each value detected as an anomaly.
+        """
+        values = np.asarray(values, dtype=np.float32).reshape(-1, 1)
+        flags = np.zeros(len(values), dtype=bool)
+
+        # Fill the window first, then train on it
+        n_warmup = min(max(self.window_size - self._n, 0), len(values))
+        if n_warmup:
+            self._append(values[:n_warmup])
+        rest = values[n_warmup:]
+        if len(rest) == 0:
+            return flags
+        if not self.is_model_trained:
+            self._fit()
+
+        self._append(rest)
+        flags[n_warmup:] = self._predict(rest) if self.quantum is None else self._cached_predict(rest)
+        return flags
+
+    def submit(self, new_value):
+        """
+        Queues the latest data point and scores the queue once it holds batch_size points.
+
+        Args:
+        - new_value: The latest value from the data stream.
+
+        Returns:
+        - Tuple (values, flags): the scored values and a boolean anomaly flag for each,
+          in arrival order. Both are empty until the pending batch is flushed.
+        """
+        self._pending[self._n_pending, 0] = new_value
+        self._n_pending += 1
+        if self._n_pending < self.batch_size:
+            return self._pending[:0, 0], np.zeros(0, dtype=bool)
+        return self.flush()
+
+    def flush(self):
+        """
+        Scores any pending points immediately, regardless of how many are queued.
+
+        Returns:
+        - Tuple (values, flags) as returned by submit.
+        """
+        values = self._pending[:self._n_pending].copy()
+        self._n_pending = 0
+        if len(values) == 0:
+            return values[:, 0], np.zeros(0, dtype=bool)
+        return values[:, 0], self._score(values)
+
+    def set_contamination(self, contamination):
+        """
+        Changes the expected proportion of anomalies without refitting the model.
+        Contamination only moves the decision threshold (offset_), not the trees, so the
+        threshold is recomputed from the scores of the current window instead.
+
+        Args:
+        - contamination: The new proportion of anomalies, between 0 and 0.5.
+        """
+        self.model.set_params(contamination=contamination)
+        if self.is_model_trained:
+            self._threshold_window = self._buf.copy()
+            scores = self._score_samples(self._threshold_window)
+            self.model.offset_ = np.percentile(scores, 100.0 * contamination)
+            if self._compiled is not None:
+                # Keep the Treelite threshold on Treelite's own scores of the same window
+                try:
+                    scores = self._treelite_scores(self._compiled, self._threshold_window)
+                    self._compiled_offset = np.percentile(scores, 100.0 * contamination)
+                except Exception as e:
+                    self._disable_treelite(e)
+            self._cache.clear()  # Cached flags were computed against the old threshold
 
     def retrain_model(self):
         """
@@ -47,10 +450,117 @@ class AnomalyDetector:
         Handles potential retraining failures.
         """
         try:
-            if len(self.data_window) >= self.window_size:
-                self.model.fit(self.data_window)
-                self.is_model_trained = True
+            if self._n >= self.window_size:
+                self._fit()
         except Exception as e:
             print(f"Retraining failed: {e}")
             self.is_model_trained = False
 
+
+class StreamingZDetector:
+    def __init__(self, window_size=100, contamination=0.05):
+        """
+        Initializes a lightweight anomaly detector that flags values far from the mean of a sliding window.
+        The window mean and variance are updated in O(1) per value (sliding Welford update, compiled
+        with Numba when available), so there is no training phase beyond filling the window.
+
+        Args:
+        - window_size: Number of recent data points the mean and variance are computed over (default is 100).
+        - contamination: The expected proportion of anomalies, used to derive the z-score threshold (default is 5%).
+        """
+        self.window_size = window_size
+        self._buf = np.zeros(window_size, dtype=np.float64)  # Ring buffer of the sliding window
+        self._n = 0  # Total number of values written; the next slot is _n % window_size
+        self.mean = 0.0
+        self._m2 = 0.0  # Sum of squared deviations from the mean over the window
+        self.set_contamination(contamination)
+
+    @property
+    def is_model_trained(self):
+        """
+        True once the window is full and detection is active.
+        """
+        return self._n >= self.window_size
+
+    @property
+    def std(self):
+        """
+        Standard deviation of the values in the current window.
+        """
+        count = min(self._n, self.window_size)
+        return np.sqrt(max(self._m2, 0.0) / count) if count else 0.0
+
+    def set_contamination(self, contamination):
+        """
+        Changes the expected proportion of anomalies by moving the z-score threshold.
+        The threshold is the two-sided normal quantile, so about `contamination` of normally
+        distributed values fall outside it.
+
+        Args:
+        - contamination: The new proportion of anomalies, between 0 and 0.5.
+        """
+        self.contamination = contamination
+        self.threshold = NormalDist().inv_cdf(1.0 - contamination / 2.0)
+
+    def detect(self, new_value):
+        """
+        Detects whether the latest data point is an anomaly.
+
+        Args:
+        - new_value: The latest value from the data stream.
+
+        Returns:
+        - Boolean: True if the value is an anomaly, False otherwise.
+        """
+        self.mean, self._m2, self._n, is_anomaly = _zscore_step(
+            self._buf, self.mean, self._m2, self._n, float(new_value), self.threshold)
+        return bool(is_anomaly)
+
+    def detect_batch(self, values):
+        """
+        Detects anomalies in a block of values in one call, for bulk paths such as replaying
+        history or backtesting. Gives the same flags as calling detect on each value in order.
+
+        Args:
+        - values: Sequence or array of values, in stream order.
+
+        Returns:
+        - Boolean ndarray: True for each value detected as an anomaly.
+        """
+        values = np.ascontiguousarray(values, dtype=np.float64).reshape(-1)
+        flags = np.zeros(len(values), dtype=np.bool_)
+        self.mean, self._m2, self._n = _zscore_block(
+            self._buf, self.mean, self._m2, self._n, values, self.threshold, flags)
+        return flags
+
+    def submit(self, new_value):
+        """
+        Scores the latest data point immediately. Provided for API compatibility with
+        AnomalyDetector, since there is no per-call overhead worth batching away.
+
+        Args:
+        - new_value: The latest value from the data stream.
+
+        Returns:
+        - Tuple (values, flags): the value and its boolean anomaly flag, as one-element arrays.
+        """
+        return np.array([new_value], dtype=np.float32), np.array([self.detect(new_value)])
+
+    def flush(self):
+        """
+        Returns nothing, since submit never holds points back.
+
+        Returns:
+        - Tuple (values, flags) of empty arrays.
+        """
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=bool)
+
+    def retrain_model(self):
+        """
+        Recomputes the window mean and variance exactly, discarding accumulated rounding error.
+        """
+        count = min(self._n, self.window_size)
+        if count:
+            window = self._buf[:count]
+            self.mean = float(window.mean())
+            self._m2 = float(((window - self.mean) ** 2).sum())
@@ -1,35 +1,35 @@
-import random
+import numpy as np
 import time
 
 def data_stream_generator(num_points=1000, anomaly_ratio=0.05):
     """
     Simulates a real-time data stream with regular patterns, random noise, and occasional anomalies.
-    
+
     Args:
     - num_points: The total number of data points to generate (default is 1000).
     - anomaly_ratio: The proportion of data points that will be anomalies (default is 5%).
-    
+
     Yields:
     - A single float value from the simulated data stream.
     """
-    data = []
-    
-    for i in range(num_points):
-        try:
-            base_value = 100 + random.uniform(-10, 10)
-            seasonal_effect = i % 100
-            value = base_value + seasonal_effect
-            if random.random() < anomaly_ratio:
-                value += random.uniform(50, 100)
-            if random.random() < 0.01:  # Introduce some random data failures
-                value = None  # Simulating a corrupt data point
-            if value is not None:
-                yield value
-        except Exception as e:
-            print(f"Data stream error: {e}")
-        time.sleep(0.01)
-    
+    rng = np.random.default_rng()
+
+    # Generate the whole stream in one vectorized pass
+    base_values = 100 + rng.uniform(-10, 10, num_points)
+    seasonal_effect = np.arange(num_points) % 100
+    values = base_values + seasonal_effect
+    anomaly_mask = rng.random(num_points) < anomaly_ratio
+    values[anomaly_mask] += rng.uniform(50, 100, anomaly_mask.sum())
+
+    # Introduce some random data failures, then repair them by carrying the last good value
+    # forward so exactly num_points values are streamed
+    corrupt_mask = rng.random(num_points) < 0.01
+    corrupt_mask[:1] = False  # The first point has no earlier value to fall back on
+    values[corrupt_mask] = np.nan
+    last_good = np.maximum.accumulate(np.where(corrupt_mask, 0, np.arange(num_points)))
+    values = values[last_good]
+
     # Stream the data one point at a time
-    for value in data:
-        yield value
+    for value in values:
+        yield float(value)
         time.sleep(0.01)  # Simulate real-time streaming by adding a small delay
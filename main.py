@@ -1,3 +1,4 @@
+import argparse
 import tkinter as tk
 from visualization import RealTimeGUI
 
@@ -6,8 +7,13 @@ def main():
     The main entry point for the real-time anomaly detection application.
     Initializes the Tkinter root window and launches the GUI.
     """
+    parser = argparse.ArgumentParser(description="Real-time data stream anomaly detection")
+    parser.add_argument("--isolation-forest", action="store_true",
+                        help="use the Isolation Forest detector instead of the streaming z-score detector")
+    args = parser.parse_args()
+
     root = tk.Tk()
-    app = RealTimeGUI(root)
+    app = RealTimeGUI(root, use_isolation_forest=args.isolation_forest)
     root.mainloop()
 
 if __name__ == "__main__":
@@ -0,0 +1,48 @@
+import queue
+from anomaly_detector import AnomalyDetector, StreamingZDetector
+from data_stream import data_stream_generator
+
+def stream_worker(output_queue, control_queue, stop_event, use_isolation_forest=False, contamination=0.05):
+    """
+    Generates the data stream and scores it for anomalies in a separate process,
+    so detection never competes with the GUI for the GIL.
+
+    Args:
+    - output_queue: Queue receiving ("data", values, flags) batches and ("status", text, color) updates.
+    - control_queue: Queue of ("contamination", value) and ("retrain", None) commands from the GUI.
+    - stop_event: Event set by the GUI to stop the stream.
+    - use_isolation_forest: Use the Isolation Forest detector instead of the streaming z-score detector.
+    - contamination: The initial expected proportion of anomalies (default is 5%).
+    """
+    detector = AnomalyDetector() if use_isolation_forest else StreamingZDetector()
+    detector.set_contamination(contamination)
+
+    for new_value in data_stream_generator():
+        if stop_event.is_set():
+            break
+        try:
+            # Apply any commands the GUI sent since the last point
+            while True:
+                try:
+                    command, value = control_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if command == "contamination":
+                    detector.set_contamination(value)
+                elif command == "retrain":
+                    detector.retrain_model()
+
+            # Queue the point; the detector may score a whole batch at once
+            values, flags = detector.submit(new_value)
+            if len(values):
+                output_queue.put(("data", values, flags))
+        except Exception as e:
+            print(f"Stream error: {e}")
+            output_queue.put(("status", "Status: Error", "#ff3b30"))
+
+    # Score whatever is still pending so no points are lost
+    values, flags = detector.flush()
+    if len(values):
+        output_queue.put(("data", values, flags))
+    if not stop_event.is_set():
+        output_queue.put(("status", "Status: Idle", "#edf2f4"))  # Set status to idle once the stream ends
@@ -2,20 +2,21 @@ import tkinter as tk
 from tkinter import ttk
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import matplotlib.pyplot as plt
-import threading
-import time
-from anomaly_detector import AnomalyDetector
-from data_stream import data_stream_generator
+import multiprocessing as mp
+import queue
+from stream_worker import stream_worker
 import numpy as np
 import sys  # For clean exit
 
 class RealTimeGUI:
-    def __init__(self, root):
+    def __init__(self, root, use_isolation_forest=False):
         """
         Initializes the real-time visualization GUI for anomaly detection.
         
         Args:
         - root: The Tkinter root window.
+        - use_isolation_forest: Use the Isolation Forest detector instead of the default
+          streaming z-score detector (default is False).
         """
         self.root = root
         self.root.title("Real-Time Anomaly Detection Dashboard")
@@ -25,23 +26,43 @@ class RealTimeGUI:
         # Set up the Matplotlib figure and Tkinter canvas for plotting
         self.fig, self.ax = plt.subplots(figsize=(8, 4), dpi=100)
 
-        # Initialize line plot for the data stream
-        self.line, = self.ax.plot([], [], label='Data Stream', color='#8ecae6', linewidth=2)
+        # Initialize line plot for the data stream. Animated artists are skipped by full
+        # redraws and drawn on top of the cached background by blitting instead.
+        self.line, = self.ax.plot([], [], label='Data Stream', color='#8ecae6', linewidth=2,
+                                  animated=True)
         
         # Initialize scatter plot for anomalies
-        self.anomaly_scatter = self.ax.scatter([], [], color='#ff3b30', label='Anomalies', zorder=5)
+        self.anomaly_scatter = self.ax.scatter([], [], color='#ff3b30', label='Anomalies', zorder=5,
+                                               animated=True)
 
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.root)
         self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1, padx=20, pady=20)
 
-        # Initialize data points and anomaly flags
-        self.data_points = []
-        self.anomaly_flags = []
+        # Cached axes background for blitting, refreshed after every full redraw
+        self.background = None
+        self.frame_count = 0
+        self.rescale_every = 20  # Recompute the axis limits only every N frames
+        self.canvas.mpl_connect('draw_event', self.on_draw)
 
-        # Anomaly detector and data generator
-        self.detector = AnomalyDetector()
-        self.data_generator = data_stream_generator()
-        self.running = False
+        # Initialize data points and anomaly flags as two contiguous arrays (values and 0/1 flags)
+        # in display order; keep only the last max_points for a sliding window effect
+        self.max_points = 200
+        self.data_points = np.empty(self.max_points, dtype=np.float32)
+        self.anomaly_flags = np.zeros(self.max_points, dtype=np.uint8)
+        self.n_points = 0  # Number of filled entries at the start of the arrays
+        self.x_values = np.arange(self.max_points)  # Shared x-axis, sliced to the filled length
+
+        # The data generator and anomaly detector run in a worker process started by start_stream.
+        # Scored batches come back over output_queue; the Tk main loop drains it and redraws at a
+        # fixed rate independent of the detection rate.
+        self.use_isolation_forest = use_isolation_forest
+        self.contamination = 0.05
+        self.worker = None
+        self.stop_event = None
+        self.output_queue = None
+        self.control_queue = None
+        self.redraw_interval = 33  # Milliseconds between redraws (~30 FPS)
+        self.redraw_job = self.root.after(self.redraw_interval, self.drain_and_draw)
 
         # Control frame for buttons and scale
         control_frame = tk.Frame(self.root, bg="#2b2d42")
@@ -62,13 +83,18 @@ class RealTimeGUI:
                                           font=("Arial", 12), bg="#2b2d42", fg="#edf2f4")
         self.sensitivity_label.grid(row=0, column=2, padx=10)
 
-        # Sensitivity scale to adjust the contamination parameter of the Isolation Forest
+        # Sensitivity scale to adjust the contamination parameter of the anomaly detector
         self.sensitivity_scale = tk.Scale(control_frame, from_=0.01, to=0.5, resolution=0.01, 
                                           orient="horizontal", command=self.update_sensitivity, 
                                           bg="#2b2d42", fg="#edf2f4", highlightbackground="#2b2d42")
         self.sensitivity_scale.set(0.05)  # Set default sensitivity
         self.sensitivity_scale.grid(row=0, column=3, padx=10)
 
+        # Button to refit the detector on the most recent window
+        self.retrain_button = tk.Button(control_frame, text="Retrain", font=("Arial", 12), 
+                                        command=self.retrain, bg="#219ebc", fg="white", width=12)
+        self.retrain_button.grid(row=0, column=4, padx=10, pady=10)
+
         # Status label to show whether the stream is idle, running, or stopped
         self.status_label = tk.Label(self.root, text="Status: Idle", font=("Arial", 14), bg="#2b2d42", fg="#edf2f4")
         self.status_label.pack(side=tk.BOTTOM, pady=10)
@@ -76,86 +102,155 @@ class RealTimeGUI:
         # Handle window closing to ensure the stream is stopped properly
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
+    def on_draw(self, event):
+        """
+        Caches the static background after a full redraw and paints the animated artists on it.
+
+        Args:
+        - event: The Matplotlib draw event.
+        """
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self.draw_artists()
+
+    def draw_artists(self):
+        """
+        Draws the animated line and anomaly scatter on top of the current canvas.
+        """
+        self.ax.draw_artist(self.line)
+        self.ax.draw_artist(self.anomaly_scatter)
+
     def update_plot(self):
         """
         Efficiently updates the plot with new data points and anomalies.
 
         This method optimizes the plotting process by using set_data for the line plot
-        and updating scatter points for anomalies, reducing the overhead of redrawing
-        the entire plot each time new data is received.
+        and updating scatter points for anomalies, then blitting only those artists onto
+        a cached background. The axes, ticks and legend are redrawn only when the limits
+        are recomputed every rescale_every frames.
         """
+        n = self.n_points
+        x = self.x_values[:n]
+        data = self.data_points[:n]
+
         # Update the line data for the data stream
-        self.line.set_data(range(len(self.data_points)), self.data_points)
+        self.line.set_data(x, data)
         
-        # Identify the x-coordinates for anomalies based on the anomaly flags
-        anomalies_x = [i for i, flag in enumerate(self.anomaly_flags) if flag]
-        # Extract the corresponding y-coordinates for the anomalies
-        anomalies_y = [self.data_points[i] for i in anomalies_x]
+        # The x-coordinate of a point is its index, so the nonzero flag positions are the anomaly x values
+        anomalies_x = np.nonzero(self.anomaly_flags[:n])[0]
         
         # Update the scatter plot for anomalies with new offsets
-        self.anomaly_scatter.set_offsets(np.column_stack((anomalies_x, anomalies_y)))
+        self.anomaly_scatter.set_offsets(np.column_stack((anomalies_x, data[anomalies_x])))
 
-        # Recalculate the limits of the axes based on the updated data
-        self.ax.relim()
-        self.ax.autoscale_view()
-        
-        # Redraw the canvas with the updated data
-        self.canvas.draw()
+        self.frame_count += 1
+        if self.background is None or self.frame_count % self.rescale_every == 0:
+            # Recalculate the limits of the axes and do a full redraw, which recaches the background
+            self.ax.relim()
+            self.ax.autoscale_view()
+            self.canvas.draw_idle()
+            return
+
+        # Restore the cached background and blit only the changed artists
+        self.canvas.restore_region(self.background)
+        self.draw_artists()
+        self.canvas.blit(self.ax.bbox)
+
+    def append_points(self, values, flags):
+        """
+        Appends scored points to the display arrays, dropping the oldest ones once
+        max_points are held.
 
-    def data_stream(self):
+        Args:
+        - values: Array of data values, in arrival order.
+        - flags: Boolean array marking which of the values are anomalies.
+        """
+        count = min(len(values), self.max_points)
+        values, flags = values[-count:], flags[-count:]
+        n = self.n_points
+        if n + count > self.max_points:
+            # Shift the newest points we keep to the front to make room at the end
+            keep = self.max_points - count
+            self.data_points[:keep] = self.data_points[n - keep:n]
+            self.anomaly_flags[:keep] = self.anomaly_flags[n - keep:n]
+            n = keep
+        self.data_points[n:n + count] = values
+        self.anomaly_flags[n:n + count] = flags
+        self.n_points = n + count
+
+    def drain_and_draw(self):
         """
-        Simulates the data stream and updates the plot in real time.
-        This method runs in a separate thread to avoid blocking the GUI.
+        Moves all scored points received from the worker into the plot buffers and redraws once.
+        Runs on the Tk main loop every redraw_interval milliseconds, so all widget
+        and canvas access stays on the GUI thread.
         """
-        self.status_label.config(text="Status: Streaming...", fg="#00bfae")  # Update status to show streaming
-        while self.running:
+        received = False
+        while self.output_queue is not None:
             try:
-                new_value = next(self.data_generator)  # Get the next data point from the stream
-                is_anomaly = self.detector.detect(new_value)  # Check if it's an anomaly
-                self.data_points.append(new_value)  # Append the data point to the list
-                self.anomaly_flags.append(is_anomaly)  # Append whether it's an anomaly
-                
-                # Keep only the last 200 data points to maintain a sliding window effect
-                if len(self.data_points) > 200:
-                    self.data_points.pop(0)  # Remove the oldest data point
-                    self.anomaly_flags.pop(0)  # Remove the corresponding anomaly flag
-                
-                self.update_plot()  # Update the plot with the new data
-                time.sleep(0.05)  # Delay to simulate real-time streaming
-            except StopIteration:
-                break  # End the stream if the generator is exhausted
-            except Exception as e:
-                print(f"Stream error: {e}")
-                self.status_label.config(text="Status: Error", fg="#ff3b30")
-        self.status_label.config(text="Status: Idle", fg="#edf2f4")  # Set status to idle once the stream stops
+                message = self.output_queue.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "data":
+                self.append_points(message[1], message[2])
+                received = True
+            elif message[0] == "status":
+                self.status_label.config(text=message[1], fg=message[2])
+        if received:
+            self.update_plot()  # Update the plot once for everything that arrived
+
+        self.redraw_job = self.root.after(self.redraw_interval, self.drain_and_draw)
+
+    def send_command(self, command, value=None):
+        """
+        Sends a command to the worker process if a stream is running.
+
+        Args:
+        - command: The command name, "contamination" or "retrain".
+        - value: The command argument, if any.
+        """
+        if self.worker is not None and self.worker.is_alive():
+            self.control_queue.put((command, value))
 
     def update_sensitivity(self, val):
         """
         Updates the anomaly detection sensitivity based on the user's input from the scale.
         
         Args:
-        - val: The new sensitivity value, which adjusts the contamination parameter in the Isolation Forest.
+        - val: The new sensitivity value, which adjusts the contamination parameter of the anomaly detector.
         """
-        new_sensitivity = float(val)
-        self.detector.model.set_params(contamination=new_sensitivity)  # Adjust the contamination parameter
-        self.detector.retrain_model()  # Retrain the model with the new sensitivity
+        self.contamination = float(val)
+        self.send_command("contamination", self.contamination)  # Move the decision threshold, no refit needed
+
+    def retrain(self):
+        """
+        Retrains the anomaly detector on its current window at the user's request.
+        """
+        self.send_command("retrain")
 
     def start_stream(self):
         """
-        Starts the data stream in a separate thread, allowing real-time data to be processed and displayed.
+        Starts the data stream in a separate process, allowing real-time data to be processed and displayed.
         Disables the start button and enables the stop button while streaming.
         """
-        self.running = True  # Set the running flag to True
+        if self.worker is not None and self.worker.is_alive():
+            self.worker.terminate()  # Discard a previous stream that has not finished shutting down
+
+        self.stop_event = mp.Event()
+        self.output_queue = mp.Queue(maxsize=512)
+        self.control_queue = mp.Queue()
+        self.worker = mp.Process(target=stream_worker, daemon=True,
+                                 args=(self.output_queue, self.control_queue, self.stop_event,
+                                       self.use_isolation_forest, self.contamination))
         self.start_button.config(state=tk.DISABLED)  # Disable the start button to prevent multiple streams
         self.stop_button.config(state=tk.NORMAL)  # Enable the stop button
-        threading.Thread(target=self.data_stream, daemon=True).start()  # Start the data stream in a new thread
+        self.status_label.config(text="Status: Streaming...", fg="#00bfae")  # Update status to show streaming
+        self.worker.start()  # Start the data stream in a new process
 
     def stop_stream(self):
         """
-        Stops the data stream by setting the running flag to False.
+        Stops the data stream by signalling the worker process to finish.
         Enables the start button and disables the stop button.
         """
-        self.running = False  # Set the running flag to False to stop the data stream
+        if self.stop_event is not None:
+            self.stop_event.set()  # Ask the worker to stop the data stream
         self.start_button.config(state=tk.NORMAL)  # Enable the start button
         self.stop_button.config(state=tk.DISABLED)  # Disable the stop button
         self.status_label.config(text="Status: Stopped", fg="#ff3b30")  # Update status to show stopped
@@ -165,6 +260,12 @@ class RealTimeGUI:
         Handles the window close event to ensure the program exits cleanly.
         Stops the data stream if it's running and closes the GUI.
         """
-        self.running = False  # Stop the stream safely
+        if self.stop_event is not None:
+            self.stop_event.set()  # Stop the stream safely
+        if self.worker is not None and self.worker.is_alive():
+            self.worker.join(timeout=1)
+            if self.worker.is_alive():
+                self.worker.terminate()
+        self.root.after_cancel(self.redraw_job)  # Stop the redraw timer
         self.root.quit()  # Quit the Tkinter main loop
         self.root.destroy()  # Destroy the window to close the application